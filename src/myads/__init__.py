@@ -1,25 +1,53 @@
+import functools
 import os
-import toml
 from ._version import __version__
 
+# Default max number of concurrent ADS queries.
+MAX_WORKERS = 8
+
 # Working directory of ADS package (where database will be stored).
 _wd = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
 
-# See if database folder exists, if not make it.
-if not os.path.isdir(os.path.join(_wd, "database")):
-    os.mkdir(os.path.join(_wd, "database"))
 
-# Load the config file with users ADS info.
-if not os.path.isfile(os.path.join(_wd, "myinfo.toml")):
-    config = None
-else:
-    myinfo = toml.load(os.path.join(_wd, "myinfo.toml"))
+@functools.lru_cache(maxsize=1)
+def _load_config():
+    """
+    Load the config file with users ADS info.
+
+    Only done once, the first time `myads.config` is accessed.
+
+    Returns
+    -------
+    config : dict
+        The users ADS info, None if there is no `myinfo.toml` file
+    """
+
+    # TOML parser (in the standard library from Python 3.11).
+    try:
+        import tomllib
+    except ImportError:
+        import tomli as tomllib
 
-    config = {
+    # See if database folder exists, if not make it.
+    if not os.path.isdir(os.path.join(_wd, "database")):
+        os.mkdir(os.path.join(_wd, "database"))
+
+    if not os.path.isfile(os.path.join(_wd, "myinfo.toml")):
+        return None
+
+    with open(os.path.join(_wd, "myinfo.toml"), "rb") as f:
+        myinfo = tomllib.load(f)
+
+    return {
         "_DATABASE_FILE": os.path.join(_wd, "database", "mydatabase.toml"),
         "_FIRST_NAME": myinfo["info"]["first_name"],
         "_LAST_NAME": myinfo["info"]["last_name"],
         "_ADS_TOKEN": myinfo["info"]["ads_token"],
     }
 
-    del myinfo
+
+def __getattr__(name):
+    # `myads.config` is loaded lazily, so importing myads does no file I/O.
+    if name == "config":
+        return _load_config()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
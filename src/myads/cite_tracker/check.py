@@ -1,5 +1,29 @@
-from myads.query import ADSQueryWrapper
-from tabulate import tabulate
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from myads import MAX_WORKERS
+
+# Recheck the cites of every paper at least this often (days), even if its
+# ADS citation count hasn't changed (e.g., one cite was removed and another
+# added).
+_RECHECK_DAYS = 7
+
+# Colours for the terminal.
+_BOLD = "\033[1m"
+_OKGREEN = "\033[92m"
+_OKCYAN = "\033[96m"
+_ENDC = "\033[0m"
+
+# Fields of the papers citing ours that we need. Only the first author (and
+# the author count) is printed, as full author lists can be very long.
+_CITE_FIELDS = "title,bibcode,first_author,author_count,date"
+
+
+def _short_authors(paper):
+    """The first author of a paper, followed by "et al." if there are more"""
+    if paper.author_count > 1:
+        return f"{paper.first_author} et al."
+    return paper.first_author
 
 
 def _print_new_cites(FIRST_NAME, LAST_NAME, reftitle, new_cites, updated=False):
@@ -16,37 +40,27 @@ def _print_new_cites(FIRST_NAME, LAST_NAME, reftitle, new_cites, updated=False):
         True if the cites are updated cites rather than new cites
     """
 
-    # Colours for the terminal.
-    BOLD = "\033[1m"
-    if updated:
-        OKCYAN = "\033[96m"
-    else:
-        OKCYAN = "\033[92m"
-    ENDC = "\033[0m"
+    from tabulate import tabulate
 
     # The paper we are printing new cites for.
+    colour = _OKCYAN if updated else _OKGREEN
     mystr = "update" if updated else "new"
     print(
         "\n",
-        f"{BOLD}{OKCYAN}{len(new_cites)} {mystr} cite(s) for "
-        f"{reftitle}{ENDC} by {FIRST_NAME} {LAST_NAME}",
+        f"{_BOLD}{colour}{len(new_cites)} {mystr} cite(s) for "
+        f"{reftitle}{_ENDC} by {FIRST_NAME} {LAST_NAME}",
     )
 
-    # Loop over each of our papers.
-    table = []
-    for paper in new_cites:
-        tmp = []
-
-        # The attributes we want to print.
-        for att in ["title", "author", "date", "bibcode"]:
-            if hasattr(paper, att):
-                if att == "date":
-                    tmp.append(getattr(paper, att)[:10])
-                else:
-                    tmp.append(getattr(paper, att))
-            else:
-                tmp.append("Unknown")
-        table.append(tmp)
+    # One row for each of the citing papers.
+    table = [
+        [
+            getattr(paper, "title", "Unknown"),
+            _short_authors(paper) if hasattr(paper, "first_author") else "Unknown",
+            getattr(paper, "date", "Unknown")[:10],
+            getattr(paper, "bibcode", "Unknown"),
+        ]
+        for paper in new_cites
+    ]
 
     print(
         tabulate(
@@ -58,7 +72,15 @@ def _print_new_cites(FIRST_NAME, LAST_NAME, reftitle, new_cites, updated=False):
     )
 
 
-def check(db, verbose, show_updates, rows=2000):
+def check(
+    db,
+    verbose,
+    show_updates,
+    rows=2000,
+    cache_ttl=0,
+    workers=MAX_WORKERS,
+    recheck_days=_RECHECK_DAYS,
+):
     """
     Check against each tracked authors' personal database to see if there are
     any new cites to their papers since the last call.
@@ -72,60 +94,104 @@ def check(db, verbose, show_updates, rows=2000):
         True to also show updated cites, not just new ones
     rows : int, optional
         Max number of rows to return during query
+    cache_ttl : float, optional
+        Reuse cached ADS responses younger than this many hours (0 to disable)
+    workers : int, optional
+        Max number of concurrent ADS queries
+    recheck_days : float, optional
+        Recheck the cites of papers not checked for this many days, even if
+        their ADS citation count is unchanged
     """
 
-    # Query object.
-    query = ADSQueryWrapper(db.get_ads_token())
+    # Query object (imported here as it pulls in pandas).
+    from myads.query import ADSQueryWrapper
 
-    # Loop over each user in the database.
-    for author in db.get_authors():
-        # Extract tracked authors information.
-        FIRST_NAME = author.forename
-        LAST_NAME = author.surname
-        ORCID = author.orcid
-        # author_database = cite_tracker.get_author_database_path(att)
-        print(f"\nChecking new cites for {FIRST_NAME} {LAST_NAME}...")
+    workers = max(1, workers)
+    query = ADSQueryWrapper(
+        db.get_ads_token(), cache_ttl=cache_ttl, max_workers=workers
+    )
 
-        # Query the tracked authors current papers.
-        if not ORCID:
-            # Query just by first name last name.
-            data = query.get(
-                q=f"first_author:{LAST_NAME},{FIRST_NAME}",
-                fl="title,citation_count,pubdate,bibcode",
-                rows=rows,
-                verbose=verbose,
-            )
-        else:
-            # Query also using the ORCID.
-            q = (
-                f"orcid_pub:{ORCID} OR orcid_user:{ORCID} OR orcid_other:{ORCID} "
-                f"first_author:{LAST_NAME},{FIRST_NAME}"
-            )
-            data = query.get(
-                q=q,
-                fl="title,citation_count,pubdate,bibcode",
-                rows=rows,
-                verbose=verbose,
+    # Query the publication lists of all tracked authors concurrently (the
+    # database is only touched from this thread).
+    authors = db.get_authors()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        author_data = list(
+            pool.map(
+                lambda a: query.author_papers(
+                    a.forename, a.surname, a.orcid, rows=rows, verbose=verbose
+                ),
+                authors,
             )
+        )
 
-        # Got a bad status code?
+    # First refresh each tracked authors publication list. Authors whose query
+    # got a bad status code are skipped this time, rather than losing the
+    # other authors' results.
+    results = []
+    for author, data in zip(authors, author_data):
         if data is None:
+            print(f"\nSkipping {author.forename} {author.surname}, query failed")
+            continue
+
+        if data.num_found > 0:
+            db.refresh_author_papers(author.id, data)
+        results.append((author, data))
+
+    db.commit()
+
+    # Then find which of their papers need their cites checked. Papers whose
+    # ADS citation count is unchanged since we last checked them can't have
+    # any new cites (unless one was also removed, which the periodic recheck
+    # catches), so skip them. Updated cites don't change the count, so we
+    # need to check every paper to show those.
+    last_checks = db.get_last_checks()
+    recheck_before = datetime.now() - timedelta(days=recheck_days)
+
+    def _needs_check(paper):
+        count, last_checked = last_checks.get(
+            (paper.bibcode, paper.title), (None, None)
+        )
+        return (
+            show_updates
+            or last_checked is None
+            or last_checked < recheck_before
+            or count != paper.citation_count
+        )
+
+    author_papers = []
+    for author, data in results:
+        papers = [p for p in data.papers if _needs_check(p)]
+        author_papers.append((author, data.num_found, papers))
+
+    # Query the cites to the papers of every author together, batching many
+    # papers per ADS query.
+    bibcodes = [p.bibcode for _, _, papers in author_papers for p in papers]
+    citations = {}
+    if len(bibcodes) > 0:
+        citations = query.citations_batch(
+            bibcodes,
+            fl=_CITE_FIELDS,
+            max_workers=workers,
+            verbose=verbose,
+        )
+
+        # Got a bad status code?
+        if citations is None:
             return
 
-        if data.num_found == 0:
+    # Loop over each user in the database.
+    for author, num_found, papers in author_papers:
+        FIRST_NAME = author.forename
+        LAST_NAME = author.surname
+        print(f"\nChecking new cites for {FIRST_NAME} {LAST_NAME}...")
+
+        if num_found == 0:
             print(f"No paper hits for {FIRST_NAME} {LAST_NAME}")
             continue
 
-        # First refresh the authors publication list
-        db.refresh_author_papers(author.id, data)
-
-        for paper in data.papers:
-            tmp_query_data = query.citations(
-                paper.bibcode, fl="title,bibcode,author,date,doi"
-            )
-
+        for paper in papers:
             new_cites, updated_cites = db.check_paper_new_cites(
-                author.id, paper, tmp_query_data
+                author.id, paper, citations[paper.bibcode]
             )
 
             if len(new_cites) > 0:
@@ -135,3 +201,8 @@ def check(db, verbose, show_updates, rows=2000):
                 _print_new_cites(
                     FIRST_NAME, LAST_NAME, paper.title, updated_cites, updated=True
                 )
+
+        # Store the changes for this author in one transaction.
+        db.commit()
+
+    db.optimize()
@@ -1,20 +1,44 @@
 import os
-import pandas as pd
+from datetime import datetime
+from types import SimpleNamespace
 from sqlalchemy import (
     Column,
+    DateTime,
     ForeignKey,
+    Index,
     Integer,
     String,
     UniqueConstraint,
     create_engine,
+    event,
+    inspect,
+    text,
 )
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import DeclarativeBase, sessionmaker
-from tabulate import tabulate
 
 home_directory = os.path.expanduser("~")
 _DATABASE = os.path.join(home_directory, "myADS_database.db")
 
 
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    Tune each new SQLite connection.
+
+    WAL journaling with synchronous=NORMAL avoids an fsync on every commit
+    while staying crash safe, and temporary tables/indices are kept in memory.
+    A writer waits (up to 5s) for a lock held by another myads process,
+    rather than failing straight away with "database is locked".
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-65536")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
+
 # Create a base class for declarative class definitions
 class Base(DeclarativeBase):
     pass
@@ -43,7 +67,15 @@ class Publication(Base):
     title = Column(String, nullable=False)
     author_id = Column(Integer, ForeignKey("authors.id"), nullable=False)
 
-    __table_args__ = (UniqueConstraint("title", "bibcode", name="uq_pub_title_bib"),)
+    # The ADS citation count when we last checked the cites of this paper, and
+    # when that was (NULL if never checked).
+    citation_count = Column(Integer)
+    last_checked = Column(DateTime)
+
+    __table_args__ = (
+        UniqueConstraint("title", "bibcode", name="uq_pub_title_bib"),
+        Index("ix_pub_author_id", "author_id"),
+    )
 
 
 # Stores information about publications that have cited our authors publications
@@ -58,6 +90,7 @@ class ReferencePublication(Base):
         UniqueConstraint(
             "title", "bibcode", "publication_id", name="uq_refpub_title_bib"
         ),
+        Index("ix_refpub_publication_id", "publication_id"),
     )
 
 
@@ -68,22 +101,128 @@ class ADSToken(Base):
     token = Column(String, nullable=False)
 
 
+def _match_publication(by_bibcode, by_title, bibcode, title):
+    """
+    Is this publication already in the database?
+
+    Matches against lookup tables built by `Database._lookup_tables`. Any
+    existing entry whose title or bibcode has changed is updated in place,
+    and the lookup tables are kept in sync.
+
+    Parameters
+    ----------
+    by_bibcode : dict
+        Existing entries keyed by bibcode
+    by_title : dict
+        Existing entries keyed by title
+    bibcode : str
+    title : str
+
+    Returns
+    -------
+    found_butnewtitle : bool
+        True if paper is there, but the title needs updated
+    found_butnewbibcode : bool
+        True if paper is there, but the bibcode needs updated
+    found : bool
+        True if paper is there and up to date
+    """
+
+    found_butnewtitle = False
+    found_butnewbibcode = False
+
+    # Is publication in database, but the title has changed?
+    entry = by_bibcode.get(bibcode)
+    if entry is not None and entry.title != title:
+        found_butnewtitle = True
+        if by_title.get(entry.title) is entry:
+            del by_title[entry.title]
+        entry.title = title
+        by_title.setdefault(title, entry)
+
+    # Is publication in database, but the bibcode has changed?
+    entry = by_title.get(title)
+    if entry is not None and entry.bibcode != bibcode:
+        found_butnewbibcode = True
+        if by_bibcode.get(entry.bibcode) is entry:
+            del by_bibcode[entry.bibcode]
+        entry.bibcode = bibcode
+        by_bibcode.setdefault(bibcode, entry)
+
+    # Is the publication in the database
+    entry = by_bibcode.get(bibcode)
+    found = entry is not None and entry.title == title
+
+    return found_butnewtitle, found_butnewbibcode, found
+
+
 class Database:
     def __init__(self):
         self.engine = create_engine(f"sqlite:///{_DATABASE}")
+        event.listen(self.engine, "connect", _set_sqlite_pragmas)
         Session = sessionmaker(bind=self.engine)
         self.session = Session()
 
+        # Bring a database made by an older version up to date.
+        self._upgrade_schema()
+
     def __del__(self):
         # Close the session to the database
         self.session.close()
 
+    def commit(self):
+        """Commit any pending changes to the database"""
+        self.session.commit()
+
+    def optimize(self):
+        """
+        Let SQLite refresh its query planner statistics, where they have gone
+        stale (cheap, and usually a no-op). Best run after a batch of writes.
+        """
+        self.session.execute(text("PRAGMA optimize"))
+        self.session.commit()
+
+    def _upgrade_schema(self):
+        """
+        Add any columns and indices added in newer versions to the existing
+        tables (`create_all` skips tables that already exist). The new columns
+        are all nullable. Tables that don't exist yet are left to `initialize`.
+        """
+
+        inspector = inspect(self.engine)
+        existing_tables = set(inspector.get_table_names())
+
+        with self.engine.begin() as conn:
+            for table in Base.metadata.sorted_tables:
+                if table.name not in existing_tables:
+                    continue
+
+                existing = {c["name"] for c in inspector.get_columns(table.name)}
+                for column in table.columns:
+                    if column.name not in existing:
+                        coltype = column.type.compile(dialect=self.engine.dialect)
+                        conn.execute(
+                            text(
+                                f"ALTER TABLE {table.name} "
+                                f"ADD COLUMN {column.name} {coltype}"
+                            )
+                        )
+
+                existing = {i["name"] for i in inspector.get_indexes(table.name)}
+                for index in table.indexes:
+                    if index.name not in existing:
+                        index.create(conn)
+
     def initialize(self):
         """First time initialization of the database"""
 
         # Create the tables in the database
         Base.metadata.create_all(self.engine)
 
+        # Gather statistics for the query planner.
+        with self.engine.begin() as conn:
+            conn.execute(text("ANALYZE"))
+
     def add_author(self, forename: str, surname: str, orcid: str = None):
         """Add a new author to the database"""
 
@@ -99,16 +238,16 @@ class Database:
 
     def delete_author(self, id: int):
         """Delete an tracked author from the database"""
-        query_result = self.session.query(Author).filter_by(id=id).first()
-
-        if query_result:
-            self.session.delete(query_result)
+        if self.session.query(Author).filter_by(id=id).delete() > 0:
             self.session.commit()
         else:
             print(f"Author {id} not found in database")
 
     def list_authors(self):
         """List all the authors in the database"""
+        import pandas as pd
+        from tabulate import tabulate
+
         df = pd.read_sql_query(self.session.query(Author).statement, self.session.bind)
 
         print(
@@ -123,12 +262,8 @@ class Database:
     def add_ads_token(self, token: str):
         """Add ADS token to database"""
 
-        # Check if we already have an entry, if so we will replace it
-        query_result = self.session.query(ADSToken).first()
-
-        if query_result:
-            query_result.token = token
-        else:
+        # If we already have an entry replace it, otherwise add one
+        if self.session.query(ADSToken).update({"token": token}) == 0:
             self.session.add(ADSToken(token=token))
         self.session.commit()
         print(f"Registered ADS token {token}")
@@ -136,86 +271,32 @@ class Database:
     def get_ads_token(self) -> str:
         """Get ADS token from database"""
 
-        query_result = self.session.query(ADSToken).first()
-        if query_result:
-            return query_result.token
-        else:
-            return None
+        return self.session.query(ADSToken.token).limit(1).scalar()
 
-    def _is_pub_in_database(self, author_id: int, bibcode: str, title: str, table):
+    def _lookup_tables(self, query):
         """
-        Is this publication already in the database?
+        Load existing publications into in memory lookup tables.
 
         Parameters
         ----------
-        author_id : int
-            The author id when table == "Publication", publication_id when
-            table == "ReferencePublication"
-        bibcode : str
-        title : str
-        table : str
-            References the table we are searching, ["ReferencePublication" or
-            "Publication"]
+        query : SQLAlchemy Query object
+            Query returning the Publication/ReferencePublication rows
 
         Returns
         -------
-        found_butnewtitle : bool
-            True if paper is there, but the title needs updated
-        found_butnewbibcode : bool
-            True if paper is there, but the bibcode needs updated
-        found : bool
-            True if paper is there and up to date
+        by_bibcode : dict
+            Rows keyed by bibcode
+        by_title : dict
+            Rows keyed by title
         """
 
-        found_butnewtitle = False
-        found_butnewbibcode = False
-        found = False
-
-        if table == "Publication":
-            X = Publication
-        elif table == "ReferencePublication":
-            X = ReferencePublication
-        else:
-            raise ValueError()
-
-        # Is publication in database, but the title has changed?
-        query_result = self.session.query(X).filter_by(bibcode=bibcode)
-
-        if table == "Publication":
-            query_result = query_result.filter_by(author_id=author_id).first()
-        else:
-            query_result = query_result.filter_by(publication_id=author_id).first()
-
-        if query_result:
-            if query_result.title != title:
-                found_butnewtitle = True
-                query_result.title = title
+        by_bibcode = {}
+        by_title = {}
+        for row in query:
+            by_bibcode.setdefault(row.bibcode, row)
+            by_title.setdefault(row.title, row)
 
-        # Is publication in database, but the bibcode has changed?
-        query_result = self.session.query(X).filter_by(title=title)
-
-        if table == "Publication":
-            query_result = query_result.filter_by(author_id=author_id).first()
-        else:
-            query_result = query_result.filter_by(publication_id=author_id).first()
-
-        if query_result:
-            if query_result.bibcode != bibcode:
-                found_butnewbibcode = True
-                query_result.bibcode = bibcode
-
-        # Is the publication in the database
-        query_result = self.session.query(X).filter_by(bibcode=bibcode, title=title)
-
-        if table == "Publication":
-            query_result = query_result.filter_by(author_id=author_id).first()
-        else:
-            query_result = query_result.filter_by(publication_id=author_id).first()
-
-        if query_result:
-            found = True
-
-        return found_butnewtitle, found_butnewbibcode, found
+        return by_bibcode, by_title
 
     def refresh_author_papers(self, id: int, data):
         """
@@ -223,6 +304,8 @@ class Database:
 
         If the title or bibcode changes, make a new entry, but keep the old one to.
 
+        Changes are not committed, see `commit()`.
+
         Parameters
         ----------
         id : int
@@ -231,21 +314,63 @@ class Database:
             List of papers
         """
 
+        # Load the authors current publications at once
+        by_bibcode, by_title = self._lookup_tables(
+            self.session.query(Publication)
+            .filter_by(author_id=id)
+            .order_by(Publication.id)
+        )
+
+        new_rows = []
         for paper in data.papers:
             # Paper already in databae?
-            found_butnewtitle, found_butnewbibcode, found = self._is_pub_in_database(
-                id, paper.bibcode, paper.title, "Publication"
+            found_butnewtitle, found_butnewbibcode, found = _match_publication(
+                by_bibcode, by_title, paper.bibcode, paper.title
             )
 
-            # If not, add it
+            # If not, add it (also to the lookup tables, so later papers in
+            # this list are matched against it)
             if not (found_butnewtitle or found_butnewbibcode) and (not found):
-                self.session.add(
-                    Publication(bibcode=paper.bibcode, title=paper.title, author_id=id)
+                row = SimpleNamespace(
+                    bibcode=paper.bibcode, title=paper.title, author_id=id
                 )
+                by_bibcode.setdefault(row.bibcode, row)
+                by_title.setdefault(row.title, row)
+                new_rows.append(row)
+
+        # Add all the new publications in a single statement. Papers shared
+        # with another tracked author are already in the table.
+        if len(new_rows) > 0:
+            self.session.execute(
+                sqlite_insert(Publication).on_conflict_do_nothing(),
+                [vars(row) for row in new_rows],
+            )
 
-        self.session.commit()
+    def get_last_checks(self):
+        """
+        Get when the cites of each publication were last checked, and the ADS
+        citation count at the time.
+
+        Publications shared by more than one tracked author are only stored
+        once, so these are not filtered by author.
 
-    def check_paper_new_cites(self, id: int, refpaper, data):
+        Returns
+        -------
+        - : dict
+            (bibcode, title) -> (citation_count, last_checked), both None if
+            the publication's cites have never been checked
+        """
+
+        query_result = self.session.query(
+            Publication.bibcode,
+            Publication.title,
+            Publication.citation_count,
+            Publication.last_checked,
+        )
+
+        return {(b, t): (count, checked) for b, t, count, checked in query_result}
+
+    def check_paper_new_cites(self, id: int, refpaper, papers):
         """
         Check if a publication has any new cites.
 
@@ -253,13 +378,15 @@ class Database:
         new bibcode, it is treated as a "updated_cite" rather than a
         "new_cite".
 
+        Changes are not committed, see `commit()`.
+
         Parameters
         ----------
         id : int
             Author ID
         refpaper : myADS paper object
             The publication we are currently checking new cites for
-        data : list[myADS paper object]
+        papers : list[myADS paper object]
             Up to date list of papers that site our publication
 
         Returns
@@ -280,30 +407,51 @@ class Database:
 
         publication_id = query_result.id
 
+        # Load all the papers already known to cite this publication at once
+        by_bibcode, by_title = self._lookup_tables(
+            self.session.query(ReferencePublication)
+            .filter_by(publication_id=publication_id)
+            .order_by(ReferencePublication.id)
+        )
+
         # Loop over each paper that cites this publication and see if any are new
         new_cites = []
         updated_cites = []
-        for paper in data.papers:
+        new_rows = []
+        for paper in papers:
             # Paper already in databae?
-            found_butnewtitle, found_butnewbibcode, found = self._is_pub_in_database(
-                publication_id, paper.bibcode, paper.title, "ReferencePublication"
+            found_butnewtitle, found_butnewbibcode, found = _match_publication(
+                by_bibcode, by_title, paper.bibcode, paper.title
             )
 
             if found_butnewtitle or found_butnewbibcode:
                 updated_cites.append(paper)
                 continue
 
+            # New cite (also added to the lookup tables, so later papers in
+            # this list are matched against it)
             if not found:
-                self.session.add(
-                    ReferencePublication(
-                        bibcode=paper.bibcode,
-                        title=paper.title,
-                        publication_id=publication_id,
-                    )
+                row = SimpleNamespace(
+                    bibcode=paper.bibcode,
+                    title=paper.title,
+                    publication_id=publication_id,
                 )
+                by_bibcode.setdefault(row.bibcode, row)
+                by_title.setdefault(row.title, row)
+                new_rows.append(row)
 
                 new_cites.append(paper)
 
-        self.session.commit()
+        # Add all the new cites in a single statement
+        if len(new_rows) > 0:
+            self.session.execute(
+                sqlite_insert(ReferencePublication).on_conflict_do_nothing(),
+                [vars(row) for row in new_rows],
+            )
+
+        # Remember the ADS citation count these cites are up to date with.
+        count = refpaper.citation_count
+        query_result.citation_count = count if isinstance(count, int) else None
+        query_result.last_checked = datetime.now()
 
         return new_cites, updated_cites
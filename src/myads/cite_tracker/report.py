@@ -1,39 +1,56 @@
-from myads.query import ADSQueryWrapper
-from tabulate import tabulate
+from concurrent.futures import ThreadPoolExecutor
 
+from myads import MAX_WORKERS
 
-def report(db):
+
+def report(db, verbose=False, cache_ttl=0, workers=MAX_WORKERS):
     """
     For each tracked author, print their current citation metrics.
 
     Parameters
     ----------
     db : myADS Database object
+    verbose : bool, optional
+        True for more output
+    cache_ttl : float, optional
+        Reuse cached ADS responses younger than this many hours (0 to disable)
+    workers : int, optional
+        Max number of concurrent ADS queries
     """
 
-    # Query object.
-    query = ADSQueryWrapper(db.get_ads_token())
+    # Query object (imported here as it pulls in pandas).
+    from myads.query import ADSQueryWrapper
+    from tabulate import tabulate
+
+    query = ADSQueryWrapper(
+        db.get_ads_token(), cache_ttl=cache_ttl, max_workers=workers
+    )
+
+    # Query the papers of all tracked authors concurrently, then report
+    # them in order.
+    authors = db.get_authors()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        author_data = list(
+            pool.map(
+                lambda a: query.author_papers(
+                    a.forename,
+                    a.surname,
+                    a.orcid,
+                    rows=50,
+                    sort="pubdate desc",
+                    verbose=verbose,
+                ),
+                authors,
+            )
+        )
 
     # Loop over each user in the database.
-    for author in db.get_authors():
+    for author, data in zip(authors, author_data):
         # Extract this users information.
         FIRST_NAME = author.forename
         LAST_NAME = author.surname
-        ORCID = author.orcid
         print(f"\nReporting cites for {FIRST_NAME} {LAST_NAME}...")
 
-        # Query.
-        if not ORCID:
-            q = f"first_author:{LAST_NAME},{FIRST_NAME}"
-        else:
-            q = (
-                f"orcid_pub:{ORCID} OR orcid_user:{ORCID} OR orcid_other:{ORCID} "
-                f"first_author:{LAST_NAME},{FIRST_NAME}"
-            )
-
-        ret_list = "title,citation_count,pubdate,bibcode"
-        data = query.get(q=q, fl=ret_list, rows=50, sort="pubdate desc")
-
         # Got a bad status code.
         if data is None:
             return
@@ -43,18 +60,7 @@ def report(db):
             print(f"No paper hits for {FIRST_NAME} {LAST_NAME}")
             continue
 
-        # Loop over each of my papers and print the number of cites.
-        table = []
-        for paper in data.papers:
-            tmp = [
-                paper.title,
-                f"{paper.citation_count} ({paper.citation_count_per_year:.1f})",
-                paper.pubdate,
-                paper.ads_link,
-            ]
-
-            table.append(tmp)
-
+        # Print the number of cites for each of my papers.
         headers = [
             "Title",
             "Citations\n(per year)",
@@ -65,10 +71,12 @@ def report(db):
 
         # Make a new column combining cite information
         df = data.papers_df
-        df["citation_count_extra"] = df.apply(
-            lambda x: f"{x['citation_count']} ({x['citation_count_per_year']:.1f})",
-            axis=1,
-        )
+        df["citation_count_extra"] = [
+            f"{count} ({per_year:.1f})"
+            for count, per_year in zip(
+                df["citation_count"], df["citation_count_per_year"]
+            )
+        ]
 
         # Print the table
         print(
@@ -1,10 +1,29 @@
 from urllib.parse import urlencode
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import requests
 
 from datetime import datetime
 import pandas as pd
 import numpy as np
 
+from myads import MAX_WORKERS
+
+# Use the faster orjson to parse ADS responses, if it is installed.
+try:
+    from orjson import loads as _json_loads
+except ImportError:
+    from json import loads as _json_loads
+
+# Link to a papers ADS page, from its bibcode.
+_ADS_LINK = "https://ui.adsabs.harvard.edu/abs/{}/abstract".format
+
+# Where ADS responses are cached (when caching is enabled).
+_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".myADS_cache")
+
 
 class _ADSPaper:
     def __init__(self, data):
@@ -22,7 +41,7 @@ class _ADSPaper:
 
 
 class _ADSQuery:
-    def __init__(self, q, fl, rows, request_data):
+    def __init__(self, q, fl, rows, request_data, start=None):
         """
         Stores the result of an individual query to ADS.
 
@@ -39,8 +58,10 @@ class _ADSQuery:
             list of field names, e.g. `fl="bibcode,author,title"`.
         rows : int
             The number of results to return (maximum from ADS is 2000).
-        request_data : `requests` "get" object
-            The raw data returned from the query from the requests lib
+        request_data : bytes
+            The raw JSON returned from the query
+        start : int, optional
+            Index of the first result returned, when paging through results
 
         Attributes
         ----------
@@ -63,6 +84,7 @@ class _ADSQuery:
         self.q = q
         self.fl = fl
         self.rows = rows
+        self.start = start
 
         # Convert the query results into a DataFrame.
         self._parse(request_data)
@@ -87,11 +109,12 @@ class _ADSQuery:
             return
             yield
 
-        atts = list(self.papers_dict.keys())
+        # Walk the columns of the dict together, one paper at a time (they are
+        # all the same length, see `_parse`).
+        atts = list(self.papers_dict)
 
-        for i in range(len(self.papers_dict[atts[0]])):
-            tmp = {key: value[i] for (key, value) in self.papers_dict.items()}
-            yield _ADSPaper(tmp)
+        for values in zip(*self.papers_dict.values()):
+            yield _ADSPaper(dict(zip(atts, values)))
 
     def _clean_df(self, row):
         """
@@ -105,7 +128,7 @@ class _ADSQuery:
         """
 
         for att in self.fl.split(","):
-            if att not in row.keys():
+            if att not in row:
                 row[att] = np.nan
 
             if type(row[att]) == list:
@@ -133,12 +156,12 @@ class _ADSQuery:
 
         Parameters
         ----------
-        request_data : `requests` "get" object
-            The data returned from the query from the requests lib
+        request_data : bytes
+            The raw JSON returned from the query
         """
 
         # Convert to JSON format.
-        request_data = request_data.json()
+        request_data = _json_loads(request_data)
 
         # Store some information about the query execution.
         rheader = request_data["responseHeader"]
@@ -149,67 +172,52 @@ class _ADSQuery:
         # Store the result.
         self.num_found = request_data["response"]["numFound"]
 
-        # Case where max_rows wasn't big enough.
-        if self.num_found > len(request_data["response"]["docs"]):
+        # Case where max_rows wasn't big enough (not an issue when paging).
+        if self.start is None and self.num_found > len(
+            request_data["response"]["docs"]
+        ):
             print(
                 f"Warning: Query {self.q} returns over max rows,"
                 f"({self.num_found} > {self.rows})",
                 "not all papers will be in the list",
             )
 
-        # Loop over each query results and ingest them into a DataFrame
-        self.papers_df = None
+        # Loop once over the query results, ingesting them into the dict and
+        # collecting the rows of the DataFrame (which is built in one go, as
+        # growing it a row at a time is quadratic).
+        fields = self.fl.split(",")
         self.papers_dict = {}
-        for i in range(len(request_data["response"]["docs"])):
+        rows = []
+        for doc in request_data["response"]["docs"]:
             # Add to the dict object.
-            for att in self.fl.split(","):
-                if att not in self.papers_dict.keys():
-                    if att not in request_data["response"]["docs"][i].keys():
-                        self.papers_dict[att] = [np.nan]
-                    else:
-                        self.papers_dict[att] = [
-                            self._clean_dict(request_data["response"]["docs"][i][att])
-                        ]
-                else:
-                    if att not in request_data["response"]["docs"][i].keys():
-                        self.papers_dict[att].append(np.nan)
-                    else:
-                        self.papers_dict[att].append(
-                            self._clean_dict(request_data["response"]["docs"][i][att])
-                        )
-
-            # Add to the dataframe object.
-            if self.papers_df is None:
-                self.papers_df = pd.DataFrame(
-                    self._clean_df(request_data["response"]["docs"][i]), index=[0]
-                )
-            else:
-                self.papers_df = pd.concat(
-                    (
-                        self.papers_df,
-                        pd.DataFrame(
-                            self._clean_df(request_data["response"]["docs"][i]),
-                            index=[0],
-                        ),
-                    ),
-                    ignore_index=True,
+            for att in fields:
+                self.papers_dict.setdefault(att, []).append(
+                    self._clean_dict(doc[att]) if att in doc else np.nan
                 )
 
+            # Add to the dataframe rows.
+            rows.append(self._clean_df(doc))
+
+        self.papers_df = pd.DataFrame(rows) if len(rows) > 0 else None
+
         # Compute some additional properties
 
         # Compute the URL to the papers ADS page.
         if self.papers_df is not None:
             if "bibcode" in self.papers_df.columns:
-                self.papers_df["ads_link"] = self.papers_df["bibcode"].apply(
-                    self._generate_ads_link
-                )
+                self.papers_df["ads_link"] = [
+                    _ADS_LINK(bibcode) for bibcode in self.papers_df["bibcode"]
+                ]
                 self.papers_dict["ads_link"] = list(self.papers_df["ads_link"].values)
 
-            # Compute the number of years since publication.
+            # Compute the number of years since publication (relative to the
+            # same "now" for every paper).
             if "pubdate" in self.papers_df.columns:
-                self.papers_df["years_since_pub"] = self.papers_df["pubdate"].apply(
-                    self._years_since_publication
-                )
+                now = datetime.now()
+                self.papers_df["years_since_pub"] = [
+                    self._years_since_publication(pubdate, now)
+                    for pubdate in self.papers_df["pubdate"]
+                ]
                 self.papers_dict["years_since_pub"] = list(
                     self.papers_df["years_since_pub"].values
                 )
@@ -219,11 +227,11 @@ class _ADSQuery:
                 "pubdate" in self.papers_df.columns
                 and "citation_count" in self.papers_df.columns
             ):
-                self.papers_df["citation_count_per_year"] = self.papers_df.apply(
-                    lambda x: self._citations_per_year(
-                        x["years_since_pub"], x["citation_count"]
-                    ),
-                    axis=1,
+                # Papers less than a month old count as 0 cites per year.
+                years = self.papers_df["years_since_pub"].to_numpy(dtype=float)
+                counts = self.papers_df["citation_count"].to_numpy(dtype=float)
+                self.papers_df["citation_count_per_year"] = np.divide(
+                    counts, years, out=np.zeros_like(counts), where=years > 1 / 12
                 )
                 self.papers_dict["citation_count_per_year"] = list(
                     self.papers_df["citation_count_per_year"].values
@@ -231,37 +239,22 @@ class _ADSQuery:
 
             # Checks
             count = None
-            for att in self.papers_dict.keys():
+            for att, values in self.papers_dict.items():
                 if count is None:
-                    count = len(self.papers_dict[att])
+                    count = len(values)
                 else:
-                    if len(self.papers_dict[att]) != count:
+                    if len(values) != count:
                         raise ValueError(f"Array {att} has a bad length")
 
-    def _generate_ads_link(self, bibcode) -> str:
-        """
-        Generate the ADS link from the bibcode
-
-        Parameters
-        ----------
-        bibcode : str
-
-        Returns
-        -------
-        uri : str
-        """
-
-        uri = f"https://ui.adsabs.harvard.edu/abs/{bibcode}/abstract"
-
-        return uri
-
-    def _years_since_publication(self, pubdate) -> float:
+    def _years_since_publication(self, pubdate, now) -> float:
         """
         Return the number of years from a given pubdate.
 
         Parameters
         ----------
         pubdate : str
+        now : datetime
+            The current time
 
         Returns
         -------
@@ -269,45 +262,23 @@ class _ADSQuery:
             Total number of years since pubdate
         """
 
-        # Convert pubdate string to datetime.
-        pubyear = int(pubdate.split("-")[0])
-        pubmonth = int(pubdate.split("-")[1])
-        if pubmonth == 0:
-            pubmonth += 1
-        dt = f"{pubyear}-{pubmonth}"
+        # Convert pubdate string ("YYYY-MM-DD", where the month and day can
+        # be "00") to datetime. Build it directly, rather than formatting and
+        # re-parsing it with the (slow) strptime.
+        pubyear, pubmonth = pubdate.split("-")[:2]
+        pubyear = int(pubyear)
+        pubmonth = max(int(pubmonth), 1)
 
         # Compute time difference from now.
-        diff = datetime.now() - datetime.strptime(dt, "%Y-%m")
+        diff = now - datetime(pubyear, pubmonth, 1)
         diff = diff.total_seconds()
 
         # Convert to years.
         return diff / 31536000
 
-    def _citations_per_year(self, pubyears, num_cites) -> float:
-        """
-        Compute the number of cites per year
-
-        Parameters
-        ----------
-        pubyears : float
-        num_cites : int
-
-        Returns
-        -------
-        - : float
-            The number of cites per year (pubyears/num_cites)
-        """
-
-        if (pubyears is None) or (num_cites is None):
-            return None
-        elif pubyears <= 1 / 12:
-            return 0.0
-        else:
-            return num_cites / pubyears
-
 
 class ADSQueryWrapper:
-    def __init__(self, ads_token):
+    def __init__(self, ads_token, cache_ttl=0, max_workers=MAX_WORKERS):
         """
         Class that wraps calls to the ADS API to make easy queries.
 
@@ -320,13 +291,23 @@ class ADSQueryWrapper:
         Parameters
         ----------
         ads_token : str
+        cache_ttl : float, optional
+            Reuse ADS responses cached on disk (in `~/.myADS_cache`) that are
+            younger than this many hours. 0 disables the cache.
+        max_workers : int, optional
+            Max number of threads that will query ADS at once through this
+            object (sets the size of the HTTP connection pool)
 
         Methods
         -------
         get(...)
             Perform a generic query to the ADS API
+        author_papers(...)
+            Query the ADS API to return the papers of a given author
         citations(...)
             Query the ADS API to return all cites to a given paper
+        citations_batch(...)
+            Query the ADS API to return all cites to each of a list of papers
         references(...)
             Query the ADS API to return all references within a given paper
         """
@@ -335,11 +316,26 @@ class ADSQueryWrapper:
         self.token = ads_token
 
         # Log how many ADS API calls this object has used in this session.
+        # Queries may be made from multiple threads, so guard the counter.
         self.ads_api_calls = 0
+        self._lock = threading.Lock()
 
         # Log how many ADS API calls remaining on our token today.
         self.ads_api_calls_remaining = None
 
+        # Max age of cached responses to reuse (hours).
+        self.cache_ttl = cache_ttl
+        if self.cache_ttl > 0:
+            self._prune_cache()
+
+        # One HTTP session for all queries, so connections to ADS are kept
+        # alive and reused (including between threads) rather than doing a new
+        # TCP/TLS handshake per query.
+        self._session = requests.Session()
+        self._session.headers["Authorization"] = f"Bearer:{self.token}"
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=max(1, max_workers))
+        self._session.mount("https://", adapter)
+
     def __del__(self):
         """
         On program end, report how many ADS API calls were used during this
@@ -353,6 +349,27 @@ class ADSQueryWrapper:
                 "on this token.",
             )
 
+    def _prune_cache(self):
+        """
+        Delete cached responses older than `self.cache_ttl`.
+
+        Cache files are keyed by the full request URL, so most (e.g., those of
+        each batch of bibcodes) are never requested again once stale.
+        """
+
+        if not os.path.isdir(_CACHE_DIR):
+            return
+
+        oldest = time.time() - self.cache_ttl * 3600
+        with os.scandir(_CACHE_DIR) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_file() and entry.stat().st_mtime < oldest:
+                        os.remove(entry.path)
+                except OSError:
+                    # E.g., removed by another myads process.
+                    pass
+
     def _encode_string(self, query):
         """
         Encode query dict into a string.
@@ -370,7 +387,7 @@ class ADSQueryWrapper:
 
         return urlencode(query)
 
-    def get(self, q, fl, sort=None, rows=10, max_attempts=3, verbose=False):
+    def get(self, q, fl, sort=None, rows=10, max_attempts=3, verbose=False, start=None):
         """
         Perform generic query using the ADS API.
 
@@ -392,6 +409,9 @@ class ADSQueryWrapper:
             How many times do we try before we give up?
         verbose : bool, optional
             True for more output
+        start : int, optional
+            Index of the first result to return, to page through queries with
+            more than `rows` results
 
         Returns
         -------
@@ -410,6 +430,10 @@ class ADSQueryWrapper:
         if sort is not None:
             query["sort"] = sort
 
+        # Add paging options
+        if start is not None:
+            query["start"] = start
+
         # Convert query dict to string.
         if verbose:
             print(f"Query dict: {q}")
@@ -418,13 +442,26 @@ class ADSQueryWrapper:
             print(f"Query str: {q}")
         url = f"https://api.adsabs.harvard.edu/v1/search/query?{q}"
 
-        # Need authorization token in header.
-        headers = {"Authorization": f"Bearer:{self.token}"}
+        # Reuse a recent enough cached response, if we have one.
+        if self.cache_ttl > 0:
+            cache_file = os.path.join(
+                _CACHE_DIR, hashlib.sha256(url.encode()).hexdigest() + ".json"
+            )
 
-        # Make get request.
+            if (
+                os.path.isfile(cache_file)
+                and time.time() - os.path.getmtime(cache_file) < self.cache_ttl * 3600
+            ):
+                if verbose:
+                    print(f"Using cached response {cache_file}")
+                with open(cache_file, "rb") as f:
+                    return _ADSQuery(q, fl, rows, f.read(), start=start)
+
+        # Make get request (the session carries the authorization header).
         for i in range(max_attempts):
-            resp = requests.get(url, headers=headers)
-            self.ads_api_calls += 1
+            resp = self._session.get(url)
+            with self._lock:
+                self.ads_api_calls += 1
 
             # Check status code.
             if resp.status_code != 200:
@@ -444,7 +481,62 @@ class ADSQueryWrapper:
         # Look at the header to see how many queries we have left.
         self.ads_api_calls_remaining = resp.headers["X-RateLimit-Remaining"]
 
-        return _ADSQuery(q, fl, rows, resp)
+        # Cache the response (written to a temporary file first, so a
+        # concurrent reader never sees a partial file).
+        if self.cache_ttl > 0:
+            os.makedirs(_CACHE_DIR, exist_ok=True)
+            tmp_file = f"{cache_file}.{os.getpid()}.{threading.get_ident()}"
+            with open(tmp_file, "wb") as f:
+                f.write(resp.content)
+            os.replace(tmp_file, cache_file)
+
+        return _ADSQuery(q, fl, rows, resp.content, start=start)
+
+    def author_papers(
+        self,
+        forename,
+        surname,
+        orcid=None,
+        fl="title,citation_count,pubdate,bibcode",
+        rows=2000,
+        sort=None,
+        verbose=False,
+    ):
+        """
+        Query the papers of an author, by first author name and, if given, by
+        ORCID.
+
+        Parameters
+        ----------
+        forename : str
+        surname : str
+        orcid : str, optional
+        fl : str, optional
+            Properties to return from query
+        rows : int, optional
+            Max number of rows to return
+        sort : str, optional
+            The sorting field and direction, e.g., `pubdate desc`
+        verbose : bool, optional
+            True for more output
+
+        Returns
+        -------
+        - : _ADSQuery object
+            The authors papers, None if we got a bad status code
+        """
+
+        if not orcid:
+            # Query just by first name last name.
+            q = f"first_author:{surname},{forename}"
+        else:
+            # Query also using the ORCID.
+            q = (
+                f"orcid_pub:{orcid} OR orcid_user:{orcid} OR orcid_other:{orcid} "
+                f"first_author:{surname},{forename}"
+            )
+
+        return self.get(q=q, fl=fl, rows=rows, sort=sort, verbose=verbose)
 
     def citations(self, bibcode, fl="title,bibcode,author,citation_count", rows=2000):
         """
@@ -472,6 +564,89 @@ class ADSQueryWrapper:
 
         return self.get(q, fl, rows=rows)
 
+    def citations_batch(
+        self,
+        bibcodes,
+        fl="title,bibcode,author,citation_count",
+        chunk_size=40,
+        max_workers=1,
+        verbose=False,
+    ):
+        """
+        Query what papers cite each paper in a list of bibcodes.
+
+        Rather than one query per bibcode, the bibcodes are OR'd together in
+        chunks of `chunk_size` (keeping the query string under the ADS limit
+        of 1000 characters), and the "reference" field of each citing paper
+        is used to match it back to the paper(s) it cites. Each chunk is paged
+        through until all the citing papers have been returned.
+
+        Parameters
+        ----------
+        bibcodes : list[str]
+            The bibcodes of the papers we want to know who cites
+        fl : str, optional
+            Properties to return from query ("reference" is always added)
+        chunk_size : int, optional
+            Max number of bibcodes to combine into a single query
+        max_workers : int, optional
+            Number of chunks to query concurrently
+        verbose : bool, optional
+            True for more output
+
+        Returns
+        -------
+        cites : dict
+            bibcode -> list of _ADSPaper objects citing that paper. None if
+            any query recieved a bad status code.
+        """
+
+        # Make sure each bibcode is a string, and only query each once.
+        bibcodes = list(dict.fromkeys(bibcodes))
+        for bibcode in bibcodes:
+            assert type(bibcode) == str
+
+        if "reference" not in fl.split(","):
+            fl = f"{fl},reference"
+
+        chunks = [
+            bibcodes[i : i + chunk_size] for i in range(0, len(bibcodes), chunk_size)
+        ]
+
+        def _query_chunk(chunk):
+            cites = {bibcode: [] for bibcode in chunk}
+            q = f"citations(bibcode:({' OR '.join(chunk)}))"
+
+            start = 0
+            while True:
+                data = self.get(q, fl, rows=2000, start=start, verbose=verbose)
+                if data is None:
+                    return None
+
+                # Match each citing paper to our paper(s) it references.
+                for paper in data.papers:
+                    references = getattr(paper, "reference", [])
+                    if type(references) == str:
+                        references = [references]
+                    elif type(references) != list:
+                        references = []
+
+                    for reference in references:
+                        if reference in cites:
+                            cites[reference].append(paper)
+
+                start += data.rows
+                if start >= data.num_found:
+                    return cites
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(_query_chunk, chunks))
+
+        if any(x is None for x in results):
+            return None
+
+        return {k: v for x in results for k, v in x.items()}
+
 
 #    def references(self, bibcode, fl="title,bibcode,author,citation_count", rows=2000):
 #        """
@@ -1,98 +1,210 @@
 import argparse
-import myads.cite_tracker as cite_tracker
+import sys
 
+from myads import MAX_WORKERS
 
-def main():
-    # Command line options.
-    parser = argparse.ArgumentParser()
-    subparsers = parser.add_subparsers(title="subcommand", dest="subcommand")
+# Help strings shared by more than one parser.
+_HELP_TOKEN = "Add/update ADS API token"
 
-    # Primary options
-    subparsers.add_parser("initialize")
 
-    user_parser = subparsers.add_parser(
-        "author", help="Add/remove/list tracked authors in the database"
-    )
-    token_parser = subparsers.add_parser("token", help="Add/update ADS API token")
-    subparsers.add_parser(
-        "report", help="Report current citation statistics for tracked authors"
-    )
-    check_parser = subparsers.add_parser(
-        "check", help="Check for any new cites for tracked authors"
+# Handlers of each (sub)command, attached to their parsers via
+# `set_defaults(func=...)`.
+def _initialize(db, args):
+    """First time initialization of the database"""
+    db.initialize()
+
+
+def _author_add(db, args):
+    """Add a user to the database"""
+    forename = input("Enter author forename: ")
+    surname = input("Enter author surname: ")
+    orcid = input("Enter author orcid (optional): ")
+
+    db.add_author(forename, surname, orcid)
+
+
+def _author_remove(db, args):
+    """Remove a user from the database"""
+    db.delete_author(args.author_id)
+
+
+def _author_list(db, args):
+    """Print user list"""
+    db.list_authors()
+
+
+def _token_add(db, args):
+    """Set the ADS API token"""
+    db.add_ads_token(args.ads_token)
+
+
+def _token_display(db, args):
+    """Display the current ADS API token"""
+    token = db.get_ads_token()
+    print(f"Currently stored ADS token: {token}")
+
+
+def _report(db, args):
+    """Report users current citation statistics"""
+    from myads.cite_tracker import report
+
+    report(db, args.verbose, cache_ttl=args.cache_ttl, workers=args.workers)
+
+
+def _check(db, args):
+    """Check if any new cites have been made to the user since last call"""
+    from myads.cite_tracker import check
+
+    check(
+        db,
+        args.verbose,
+        args.show_updates,
+        cache_ttl=args.cache_ttl,
+        workers=args.workers,
     )
 
-    # Author options
+
+def _populate_author_parser(user_parser):
+    """Add the add/list/remove actions to the `author` subcommand"""
     user_subparser = user_parser.add_subparsers(
         title="user_subparser", dest="user_subparser"
     )
-    user_subparser.add_parser("add", help="Add a new author to be tracked")
-    user_subparser.add_parser("list", help="List current tracked authors")
+    tmp = user_subparser.add_parser("add", help="Add a new author to be tracked")
+    tmp.set_defaults(func=_author_add)
+    tmp = user_subparser.add_parser("list", help="List current tracked authors")
+    tmp.set_defaults(func=_author_list)
     tmp = user_subparser.add_parser("remove", help="Remove an existing tracked author")
     tmp.add_argument("author_id", help="ID of tracked author to remove", type=int)
+    tmp.set_defaults(func=_author_remove)
 
-    # ADS API token options
+
+def _populate_token_parser(token_parser):
+    """Add the add/display actions to the `token` subcommand"""
     token_subparser = token_parser.add_subparsers(
         title="token_subparser", dest="token_subparser"
     )
-    tmp = token_subparser.add_parser("add", help="Add/update ADS API token")
+    tmp = token_subparser.add_parser("add", help=_HELP_TOKEN)
     tmp.add_argument("ads_token", help="ADS token to add")
-    token_subparser.add_parser("display", help="Display current ADS token")
+    tmp.set_defaults(func=_token_add)
+    tmp = token_subparser.add_parser("display", help="Display current ADS token")
+    tmp.set_defaults(func=_token_display)
 
-    # Check options
-    check_parser.add_argument(
+
+def _build_ads_parent():
+    """Options shared by all subcommands that query ADS"""
+    ads_parent = argparse.ArgumentParser(add_help=False)
+    ads_parent.add_argument(
         "--verbose", help="True for more output", action="store_true"
     )
+    ads_parent.add_argument(
+        "--cache-ttl",
+        help="Reuse ADS responses cached within this many hours (default: 0, "
+        "no caching)",
+        type=float,
+        default=0,
+    )
+    ads_parent.add_argument(
+        "--workers",
+        help=f"Max number of concurrent ADS queries (default: {MAX_WORKERS})",
+        type=int,
+        default=MAX_WORKERS,
+    )
+
+    return ads_parent
+
+
+def _populate_check_parser(check_parser):
+    """Add the options of the `check` subcommand"""
     check_parser.add_argument(
         "--show_updates",
         help="True to show when a cite updates and not just new cites",
         action="store_true",
     )
 
-    args = parser.parse_args()
 
-    if args.subcommand == "token":
-        db = cite_tracker.Database()
+# Subcommand name -> (help string, function populating its options, True if
+# the subcommand queries ADS and takes the shared ADS options, handler or None
+# if the handler is set by one of its own subcommands).
+_SUBCOMMANDS = {
+    "initialize": (None, None, False, _initialize),
+    "author": (
+        "Add/remove/list tracked authors in the database",
+        _populate_author_parser,
+        False,
+        None,
+    ),
+    "token": (_HELP_TOKEN, _populate_token_parser, False, None),
+    "report": (
+        "Report current citation statistics for tracked authors",
+        None,
+        True,
+        _report,
+    ),
+    "check": (
+        "Check for any new cites for tracked authors",
+        _populate_check_parser,
+        True,
+        _check,
+    ),
+}
+
+
+def _build_parser(command=None):
+    """
+    Construct the command line parser.
+
+    Every subcommand is registered, so usage and error messages are the same
+    regardless of `command`, but only the options of `command` are built.
+
+    Parameters
+    ----------
+    command : str, optional
+        The subcommand being run. If None, or not a known subcommand, the
+        options of all subcommands are built (e.g., for `myads --help`).
+    """
+    if command not in _SUBCOMMANDS:
+        command = None
 
-        # Set the ADS API token.
-        if args.token_subparser == "add":
-            db.add_ads_token(args.ads_token)
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(title="subcommand", dest="subcommand")
 
-        # Display the current ADS API token.
-        if args.token_subparser == "display":
-            token = db.get_ads_token()
-            print(f"Currently stored ADS token: {token}")
+    # The shared ADS options are only needed by the subcommands querying ADS.
+    ads_parent = None
+    if command is None or _SUBCOMMANDS[command][2]:
+        ads_parent = _build_ads_parent()
 
-    # Report users current citation statistics
-    elif args.subcommand == "report":
-        db = cite_tracker.Database()
-        cite_tracker.report(db)
+    for name, (help_text, populate, queries_ads, func) in _SUBCOMMANDS.items():
+        kwargs = {}
+        if help_text is not None:
+            kwargs["help"] = help_text
+        if queries_ads and command in (None, name):
+            kwargs["parents"] = [ads_parent]
+        subparser = subparsers.add_parser(name, **kwargs)
+        if func is not None:
+            subparser.set_defaults(func=func)
 
-    # Check if any new cites have been made to the user since last call
-    elif args.subcommand == "check":
-        db = cite_tracker.Database()
-        cite_tracker.check(db, args.verbose, args.show_updates)
+        if populate is not None and command in (None, name):
+            populate(subparser)
 
-    # First time initialization of the database
-    elif args.subcommand == "initialize":
-        db = cite_tracker.Database()
-        db.initialize()
+    return parser
 
-    # Manage tracked authors
-    elif args.subcommand == "author":
-        db = cite_tracker.Database()
 
-        # Add a user to the database
-        if args.user_subparser == "add":
-            forename = input("Enter author forename: ")
-            surname = input("Enter author surname: ")
-            orcid = input("Enter author orcid (optional): ")
+def main():
+    # Command line options (only the requested subcommand's are built).
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    parser = _build_parser(command)
+    args = parser.parse_args()
 
-            db.add_author(forename, surname, orcid)
+    # Incomplete commands just print the relevant help, without opening the
+    # database.
+    if args.subcommand is None:
+        parser.print_help()
+        return
+    if getattr(args, "func", None) is None:
+        parser.parse_args([args.subcommand, "--help"])
 
-        # Remove a user from the database
-        elif args.user_subparser == "remove":
-            db.delete_author(args.author_id)
+    # Imported here so that help and usage errors don't pay for importing
+    # the database (SQLAlchemy) and reporting modules.
+    from myads.cite_tracker import Database
 
-        # Print user list.
-        elif args.user_subparser == "list":
-            db.list_authors()
+    args.func(Database(), args)